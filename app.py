@@ -3,52 +3,80 @@
 OCR host - CPU-only, small-memory friendly.
 
 Usage:
-  python ocr_cpu_only.py
+  python app.py
+  WEB_CONCURRENCY=2 gunicorn --preload --threads 4 -b 0.0.0.0:8000 app:app
 Notes:
+ - With --preload the model is loaded (and warmed up) once in the gunicorn master and shared
+   copy-on-write by the forked workers; each worker gets cpu_count / WEB_CONCURRENCY OCR threads.
  - Make sure you installed PaddlePaddle CPU wheel as per Paddle docs and paddleocr.
  - This script forces CPU by clearing CUDA_VISIBLE_DEVICES and setting paddle device to 'cpu'.
+ - Faster CPU inference: export the det/rec inference models with paddle2onnx, e.g.
+     paddle2onnx --model_dir en_PP-OCRv4_det_infer --model_filename inference.pdmodel
+                 --params_filename inference.pdiparams --save_file models/det.onnx
+   (same for rec -> models/rec.onnx, plus ppocr/utils/en_dict.txt), install onnxruntime
+   (or onnxruntime-openvino) and run with OCR_BACKEND=onnx.
 """
-import os, sys, time, json, mimetypes, threading
-from flask import Flask, send_file, render_template_string, jsonify
-from PIL import Image
+import os, sys, time, pickle, sqlite3, tempfile, mimetypes, threading
 
-# ---- Force single-threaded BLAS/OpenMP before heavy imports ----
-os.environ.setdefault("OMP_NUM_THREADS", "1")
-os.environ.setdefault("MKL_NUM_THREADS", "1")
-os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")
-os.environ.setdefault("VECLIB_MAXIMUM_THREADS", "1")
+# ---- Size BLAS/OpenMP thread pools before heavy imports (OCR_CPU_THREADS=1 for a tiny box) ----
+# split cores between gunicorn workers (WEB_CONCURRENCY) so they don't oversubscribe the CPU
+WORKERS = max(1, int(os.environ.get("WEB_CONCURRENCY", 1)))
+CPU_THREADS = int(os.environ.get("OCR_CPU_THREADS", max(1, (os.cpu_count() or 1) // WORKERS)))
+os.environ.setdefault("OMP_NUM_THREADS", str(CPU_THREADS))
+os.environ.setdefault("MKL_NUM_THREADS", str(CPU_THREADS))
+os.environ.setdefault("OPENBLAS_NUM_THREADS", str(CPU_THREADS))
+os.environ.setdefault("VECLIB_MAXIMUM_THREADS", str(CPU_THREADS))
 
 # ---- Force Paddle to use CPU only ----
 # This prevents any accidental GPU usage even if a GPU-enabled wheel is present.
 os.environ["CUDA_VISIBLE_DEVICES"] = ""
 
+# numpy (and its OpenBLAS pool) must load after the thread caps above
+import numpy as np
+from flask import Flask, send_file, jsonify
+from PIL import Image
+
 # ---- Config ----
 HOST = "0.0.0.0"
 PORT = int(os.environ.get("PORT", 8000))
 IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp", ".tiff", ".webp")
-MAX_DIM = int(os.environ.get("OCR_MAX_DIM", 1024))   # reduce to 800 or 600 if memory spikes
-CACHE_FN = "ocr_cache_cpu.json"
+MAX_DIM = int(os.environ.get("OCR_MAX_DIM", 736))    # also the detector's side limit; reduce to 600 if memory spikes
+REC_BATCH = int(os.environ.get("OCR_REC_BATCH", 16))  # text crops recognized per forward pass
+CACHE_FN = "ocr_cache_cpu.db"     # sqlite key/value: abs image path -> pickled entry
+# <= THUMB_DIM preview served on /image; its mtime mirrors the source image.
+# Kept in a subdir so find_image() (which scans only the cwd itself) can never pick it up.
+THUMB_FN = os.path.join(".ocr_thumb", "ocr_thumb_cpu.jpg")
+THUMB_DIM = 600                  # matches the page's img max-width
+MTIME_TTL = float(os.environ.get("OCR_MTIME_TTL", 2.0))   # seconds to trust the last stat of the image
+IMAGE_MAX_AGE = int(os.environ.get("OCR_IMAGE_MAX_AGE", 3600))   # browser cache for /image; URLs carry ?v=<mtime>
 USE_ANGLE = False    # disable angle classifier to save memory/time
 USE_GPU_FLAG = False # we pass this to PaddleOCR explicitly
+USE_MKLDNN = os.environ.get("OCR_MKLDNN", "1") != "0"   # oneDNN conv/gemm kernels on CPU
+OCR_BACKEND = os.environ.get("OCR_BACKEND", "paddle")    # "onnx" -> onnxruntime (OpenVINO EP if installed)
+ONNX_DET = os.environ.get("OCR_ONNX_DET", "models/det.onnx")
+ONNX_REC = os.environ.get("OCR_ONNX_REC", "models/rec.onnx")
+ONNX_REC_DICT = os.environ.get("OCR_REC_DICT", "models/en_dict.txt")   # ppocr/utils/en_dict.txt
 
 HTML_TMPL = """<!doctype html><meta charset="utf-8"><title>OCR - CPU</title>
 <style>body{font-family:system-ui;padding:18px}img{max-width:600px;height:auto;border:1px solid #ddd}</style>
 <h1>OCR (CPU)</h1><p>Image: <b>{{img_name}}</b></p>
 <div style="display:flex;gap:20px;align-items:flex-start">
-  <div><img src="/image" alt="image"><p><a href="/image" download>Download</a></p></div>
+  <div><img src="/image?v={{v}}" alt="image"><p><a href="/image/full?v={{v}}" download>Download</a></p></div>
   <div><h3>Extracted text</h3><pre style="white-space:pre-wrap;background:#f7f7f7;padding:10px;border-radius:6px">{{text}}</pre>
   <p><a href="/api/ocr">JSON output</a></p></div>
 </div>
 """
 
 app = Flask(__name__)
+# compiled once here instead of on every / hit; Flask's env keeps HTML autoescaping on
+page_tmpl = app.jinja_env.from_string(HTML_TMPL)
 
 # ---- Find first image in current directory ----
+# (one readdir pass; d_type answers is_file() without a stat per entry; only matches are ordered)
 def find_image():
-    for f in sorted(os.listdir(os.getcwd())):
-        if f.lower().endswith(IMAGE_EXTS) and os.path.isfile(f):
-            return os.path.abspath(f)
-    return None
+    with os.scandir(os.getcwd()) as it:
+        names = [e.name for e in it if e.name.lower().endswith(IMAGE_EXTS) and e.is_file()]
+    return os.path.abspath(min(names)) if names else None
 
 IMAGE_PATH = find_image()
 if not IMAGE_PATH:
@@ -56,31 +84,282 @@ if not IMAGE_PATH:
 
 # ---- Simple disk cache to avoid re-running OCR on restarts ----
 cache_lock = threading.Lock()
-def load_cache():
+# one indexed row per image, so a lookup never reads other images' results.
+# Short-lived connections: safe across threads and forked gunicorn workers; sqlite does the locking.
+def _cache_db():
+    db = sqlite3.connect(CACHE_FN, timeout=10)
+    db.execute("CREATE TABLE IF NOT EXISTS ocr_cache (key TEXT PRIMARY KEY, entry BLOB NOT NULL)")
+    return db
+def load_cache(key):
     try:
-        with open(CACHE_FN, "r", encoding="utf-8") as fh:
-            return json.load(fh)
+        db = _cache_db()
+        try:
+            row = db.execute("SELECT entry FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+        finally:
+            db.close()
+        return pickle.loads(row[0]) if row else None
     except Exception:
-        return {}
-def save_cache(d):
+        return None
+def save_cache(key, entry):
     try:
-        with open(CACHE_FN, "w", encoding="utf-8") as fh:
-            json.dump(d, fh, ensure_ascii=False)
+        db = _cache_db()
+        try:
+            with db:
+                db.execute("INSERT OR REPLACE INTO ocr_cache (key, entry) VALUES (?, ?)",
+                           (key, pickle.dumps(entry, protocol=5)))
+        finally:
+            db.close()
     except Exception:
         pass
 
+# ---- Atomic file write: temp file in the same dir, then os.replace -> readers never see a torn file ----
+# NamedTemporaryFile creates 0600 files; give the result the mode a plain open() would (0666 & ~umask).
+# os.umask can only be read by setting it, so do that once here at import, before any threads exist.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def atomic_write(path, write):
+    tmp = None
+    try:
+        with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(os.path.abspath(path)),
+                                         prefix=os.path.basename(path) + ".", delete=False) as fh:
+            tmp = fh.name
+            write(fh)
+        os.chmod(tmp, 0o666 & ~_UMASK)
+        os.replace(tmp, path)
+        return True
+    except Exception:
+        if tmp and os.path.exists(tmp):
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+        return False
+
+# ---- Small preview for /image, written once per source mtime (best effort, like save_cache) ----
+_thumb_failed_mtime = None   # source mtime we already failed to build a preview for; don't retry per hit
+
+def save_thumb(img, mtime):
+    global _thumb_failed_mtime
+    try:
+        thumb = img.copy()
+        thumb.thumbnail((THUMB_DIM, THUMB_DIM), Image.LANCZOS)
+        os.makedirs(os.path.dirname(THUMB_FN), exist_ok=True)
+        if atomic_write(THUMB_FN, lambda fh: thumb.save(fh, "JPEG", quality=85, optimize=True)):
+            os.utime(THUMB_FN, (mtime, mtime))
+            return True
+    except Exception:
+        pass
+    _thumb_failed_mtime = mtime
+    return False
+
+def thumb_is_fresh(mtime):
+    try:
+        return os.path.getmtime(THUMB_FN) == mtime
+    except OSError:
+        return False
+def ensure_thumb(mtime):
+    # the OCR miss path writes it, but a cache hit (restart, another worker) may find it missing/stale
+    global _thumb_failed_mtime
+    if thumb_is_fresh(mtime):
+        return True
+    if _thumb_failed_mtime == mtime:
+        return False
+    with cache_lock:
+        if thumb_is_fresh(mtime):
+            return True
+        if _thumb_failed_mtime == mtime:
+            return False
+        try:
+            return save_thumb(open_and_downscale(IMAGE_PATH, MAX_DIM), mtime)
+        except Exception:
+            _thumb_failed_mtime = mtime
+            return False
+
+# ---- Optional SIMD resizer (Rust, AVX2/SSE4.1); falls back to Pillow if missing ----
+try:
+    from cykooz.resizer import FilterType, ResizeAlg, Resizer
+    # cpu_extensions defaults to the best the CPU supports (AVX2 > SSE4.1 > none)
+    _resizer = Resizer(ResizeAlg.convolution(FilterType.lanczos3))
+except ImportError:
+    _resizer = None
+
 # ---- Downscale big images (reduce memory) ----
 def open_and_downscale(path, max_dim=MAX_DIM):
-    img = Image.open(path).convert("RGB")
+    img = Image.open(path)
     w, h = img.size
+    new_size = img.size
     max_side = max(w, h)
     if max_side > max_dim:
         scale = max_dim / float(max_side)
         new_size = (int(w * scale), int(h * scale))
-        img = img.resize(new_size, Image.LANCZOS)
+        # JPEG only (no-op otherwise): let libjpeg decode at 1/2..1/8 scale, still >= new_size
+        img.draft("RGB", new_size)
+    img = img.convert("RGB")
+    if img.size != new_size:
+        if _resizer is not None:
+            dst = Image.new("RGB", new_size)
+            _resizer.resize_pil(img, dst)
+            img = dst
+        else:
+            # reducing_gap: box-reduce by an integer factor first, then lanczos the small intermediate
+            img = img.resize(new_size, Image.LANCZOS, reducing_gap=3.0)
     return img
 
-# ---- Lazy PaddleOCR init (CPU-only) ----
+# ---- PIL RGB -> contiguous BGR uint8 array (PaddleOCR's native input) ----
+# Written into one pooled buffer sized for MAX_DIM instead of a fresh allocation per OCR run.
+# The returned array is a view of the pool: callers must hold cache_lock until they are done with it.
+_bgr_pool = np.empty(MAX_DIM * MAX_DIM * 3, dtype=np.uint8)
+
+def to_bgr_array(img):
+    rgb = np.asarray(img, dtype=np.uint8)
+    h, w = rgb.shape[:2]
+    if h * w * 3 > _bgr_pool.size:   # not downscaled to MAX_DIM; don't grow the pool
+        return np.ascontiguousarray(rgb[:, :, ::-1])
+    out = _bgr_pool[:h * w * 3].reshape(h, w, 3)   # flat prefix -> still C-contiguous
+    np.copyto(out, rgb[:, :, ::-1])
+    return out
+
+# ---- Optional ONNX Runtime backend (OCR_BACKEND=onnx): PP-OCR det+rec exported with paddle2onnx ----
+# Same .ocr(img, cls=...) -> [[box, (text, score)], ...] contract as PaddleOCR, so parse_paddle is shared.
+# Pre/post-processing mirrors PaddleOCR's predict_det.py (DB) and predict_rec.py (CTC) defaults.
+class OnnxOCR:
+    DET_THRESH, DET_BOX_THRESH, DET_UNCLIP_RATIO, DET_MAX_CANDIDATES = 0.3, 0.6, 1.5, 1000
+    DET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+    DET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+    REC_H, REC_W = 48, 320   # PP-OCRv3/v4 rec input (3, 48, 320); width grows with the widest crop
+    DROP_SCORE = 0.5
+
+    def __init__(self, det_path, rec_path, dict_path, det_limit=MAX_DIM, rec_batch=REC_BATCH, threads=CPU_THREADS):
+        try:
+            import onnxruntime as ort
+            import cv2, pyclipper
+        except Exception as e:
+            raise RuntimeError("OCR_BACKEND=onnx needs onnxruntime, opencv and pyclipper: " + str(e))
+        self.cv2, self.pyclipper = cv2, pyclipper
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = threads
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        available = ort.get_available_providers()
+        providers = [p for p in ("OpenVINOExecutionProvider", "CPUExecutionProvider") if p in available]
+        self.det = ort.InferenceSession(det_path, sess_options=opts, providers=providers)
+        self.rec = ort.InferenceSession(rec_path, sess_options=opts, providers=providers)
+        with open(dict_path, "r", encoding="utf-8") as fh:
+            # index 0 is the CTC blank; PaddleOCR appends a space when use_space_char=True
+            self.chars = ["blank"] + [ln.rstrip("\r\n") for ln in fh] + [" "]
+        self.det_limit = det_limit
+        self.rec_batch = rec_batch
+
+    def ocr(self, img, cls=False):
+        boxes = self._detect(img)
+        if not boxes:
+            return [[]]
+        crops = [self._crop(img, b) for b in boxes]
+        recs = self._recognize(crops)
+        return [[[b.tolist(), r] for b, r in zip(boxes, recs) if r[1] >= self.DROP_SCORE]]
+
+    # -- detection (DBNet) --
+    def _detect(self, img):
+        cv2 = self.cv2
+        h, w = img.shape[:2]
+        ratio = min(1.0, float(self.det_limit) / max(h, w))
+        rh = max(32, int(round(h * ratio / 32) * 32))
+        rw = max(32, int(round(w * ratio / 32) * 32))
+        x = cv2.resize(img, (rw, rh)).astype(np.float32) / 255.0
+        x = ((x - self.DET_MEAN) / self.DET_STD).transpose(2, 0, 1)[None]
+        pred = self.det.run(None, {self.det.get_inputs()[0].name: np.ascontiguousarray(x)})[0][0, 0]
+        bitmap = (pred > self.DET_THRESH).astype(np.uint8) * 255
+        contours, _ = cv2.findContours(bitmap, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+        boxes = []
+        for contour in contours[:self.DET_MAX_CANDIDATES]:
+            pts, sside = self._mini_box(contour)
+            if sside < 3 or self._box_score(pred, pts) < self.DET_BOX_THRESH:
+                continue
+            expanded = self._unclip(pts)
+            if expanded is None:
+                continue
+            pts, sside = self._mini_box(expanded.reshape(-1, 1, 2))
+            if sside < 5:
+                continue
+            pts[:, 0] = np.clip(np.round(pts[:, 0] * w / rw), 0, w - 1)
+            pts[:, 1] = np.clip(np.round(pts[:, 1] * h / rh), 0, h - 1)
+            if np.linalg.norm(pts[0] - pts[1]) <= 3 or np.linalg.norm(pts[0] - pts[3]) <= 3:
+                continue
+            boxes.append(pts.astype(np.float32))
+        # reading order: top-to-bottom, then left-to-right
+        boxes.sort(key=lambda b: (b[0][1], b[0][0]))
+        return boxes
+
+    def _mini_box(self, contour):
+        rect = self.cv2.minAreaRect(contour)
+        pts = sorted(self.cv2.boxPoints(rect).tolist(), key=lambda p: p[0])
+        left, right = pts[:2], pts[2:]
+        tl, bl = (left[0], left[1]) if left[0][1] <= left[1][1] else (left[1], left[0])
+        tr, br = (right[0], right[1]) if right[0][1] <= right[1][1] else (right[1], right[0])
+        return np.array([tl, tr, br, bl], dtype=np.float32), min(rect[1])
+
+    def _box_score(self, pred, pts):
+        h, w = pred.shape
+        xmin, xmax = int(np.clip(np.floor(pts[:, 0].min()), 0, w - 1)), int(np.clip(np.ceil(pts[:, 0].max()), 0, w - 1))
+        ymin, ymax = int(np.clip(np.floor(pts[:, 1].min()), 0, h - 1)), int(np.clip(np.ceil(pts[:, 1].max()), 0, h - 1))
+        mask = np.zeros((ymax - ymin + 1, xmax - xmin + 1), dtype=np.uint8)
+        self.cv2.fillPoly(mask, [(pts - [xmin, ymin]).astype(np.int32)], 1)
+        return self.cv2.mean(pred[ymin:ymax + 1, xmin:xmax + 1], mask)[0]
+
+    def _unclip(self, pts):
+        area = self.cv2.contourArea(pts)
+        length = self.cv2.arcLength(pts, True)
+        if length == 0:
+            return None
+        offset = self.pyclipper.PyclipperOffset()
+        offset.AddPath(pts.astype(np.int64).tolist(), self.pyclipper.JT_ROUND, self.pyclipper.ET_CLOSEDPOLYGON)
+        expanded = offset.Execute(area * self.DET_UNCLIP_RATIO / length)
+        if len(expanded) != 1:
+            return None
+        return np.array(expanded[0], dtype=np.float32)
+
+    def _crop(self, img, pts):
+        cv2 = self.cv2
+        cw = int(max(np.linalg.norm(pts[0] - pts[1]), np.linalg.norm(pts[2] - pts[3])))
+        ch = int(max(np.linalg.norm(pts[0] - pts[3]), np.linalg.norm(pts[1] - pts[2])))
+        dst = np.float32([[0, 0], [cw, 0], [cw, ch], [0, ch]])
+        M = cv2.getPerspectiveTransform(pts, dst)
+        crop = cv2.warpPerspective(img, M, (cw, ch), borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC)
+        if ch and crop.shape[0] / float(crop.shape[1]) >= 1.5:
+            crop = np.rot90(crop)
+        return crop
+
+    # -- recognition (CTC) --
+    def _recognize(self, crops):
+        out = [("", 0.0)] * len(crops)
+        # batch crops of similar aspect ratio together, like PaddleOCR, to minimize padding
+        order = np.argsort([c.shape[1] / float(c.shape[0]) for c in crops])
+        for i in range(0, len(crops), self.rec_batch):
+            idx = order[i:i + self.rec_batch]
+            max_ratio = max(self.REC_W / float(self.REC_H),
+                            max(crops[j].shape[1] / float(crops[j].shape[0]) for j in idx))
+            width = int(self.REC_H * max_ratio)
+            batch = np.zeros((len(idx), 3, self.REC_H, width), dtype=np.float32)
+            for k, j in enumerate(idx):
+                c = crops[j]
+                rw = min(width, int(np.ceil(self.REC_H * c.shape[1] / float(c.shape[0]))))
+                x = self.cv2.resize(c, (rw, self.REC_H)).astype(np.float32) / 255.0
+                batch[k, :, :, :rw] = ((x - 0.5) / 0.5).transpose(2, 0, 1)
+            probs = self.rec.run(None, {self.rec.get_inputs()[0].name: batch})[0]
+            for k, j in enumerate(idx):
+                out[j] = self._ctc_decode(probs[k])
+        return out
+
+    def _ctc_decode(self, probs):
+        ids = probs.argmax(axis=1)
+        conf = probs.max(axis=1)
+        keep = ids != 0
+        keep[1:] &= ids[1:] != ids[:-1]
+        ids, conf = ids[keep], conf[keep]
+        text = "".join(self.chars[i] for i in ids if i < len(self.chars))
+        return text, float(conf.mean()) if len(conf) else 0.0
+
+# ---- PaddleOCR init (CPU-only); lazy, but warmed up at startup when run directly ----
 ocr_instance = None
 ocr_init_lock = threading.Lock()
 
@@ -91,6 +370,9 @@ def get_ocr():
     with ocr_init_lock:
         if ocr_instance is not None:
             return ocr_instance
+        if OCR_BACKEND == "onnx":
+            ocr_instance = OnnxOCR(ONNX_DET, ONNX_REC, ONNX_REC_DICT)
+            return ocr_instance
         # Import paddle and set device to cpu explicitly where available
         try:
             import paddle
@@ -108,10 +390,35 @@ def get_ocr():
             raise RuntimeError("paddleocr not installed: " + str(e))
 
         # create PaddleOCR with use_gpu=False to force CPU usage
-        ocr_instance = PaddleOCR(use_angle_cls=USE_ANGLE, use_gpu=USE_GPU_FLAG, lang="en")
+        ocr_instance = PaddleOCR(use_angle_cls=USE_ANGLE, use_gpu=USE_GPU_FLAG, lang="en",
+                                 enable_mkldnn=USE_MKLDNN, cpu_threads=CPU_THREADS,
+                                 # input is already downscaled to MAX_DIM, so detect at that size, never above
+                                 det_limit_side_len=MAX_DIM, det_limit_type="max",
+                                 rec_batch_num=REC_BATCH, use_dilation=False)
         return ocr_instance
 
+# ---- Load the model and run one tiny OCR so the first real request doesn't pay for it ----
+def warmup_ocr():
+    t0 = time.time()
+    ocr = get_ocr()
+    ocr.ocr(np.zeros((32, 32, 3), dtype=np.uint8), cls=USE_ANGLE)
+    print(f"OCR warmed up in {time.time() - t0:.1f}s")
+
 # ---- Normalize PaddleOCR result ----
+def _text_and_score(text_part):
+    text = ""
+    score = None
+    if isinstance(text_part, (list, tuple)):
+        if len(text_part) >= 1:
+            text = text_part[0] if isinstance(text_part[0], str) else str(text_part[0])
+        if len(text_part) >= 2 and isinstance(text_part[1], (float,int)):
+            score = float(text_part[1])
+    elif isinstance(text_part, str):
+        text = text_part
+    else:
+        text = str(text_part)
+    return text, score
+
 def parse_paddle(res):
     out = []
     if not res:
@@ -119,48 +426,69 @@ def parse_paddle(res):
     # handle nested versions
     if isinstance(res, list) and len(res) == 1 and isinstance(res[0], list):
         res = res[0]
+    # fast path: well-formed result -> every box cast in one (N, 4, 2) array op
+    # (truncates toward zero, same as int(float(x)))
+    try:
+        boxes = np.asarray([det[0] for det in res], dtype=np.float64)[:, :, :2].astype(np.int64).tolist()
+        texts = [_text_and_score(det[1]) for det in res]
+    except Exception:
+        pass
+    else:
+        return [{"text": t, "score": sc, "box": b} for (t, sc), b in zip(texts, boxes)]
+    # ragged/malformed result: go detection by detection and skip the bad ones
     for det in res:
         try:
-            box = det[0]
-            text_part = det[1]
+            text, score = _text_and_score(det[1])
+            norm_box = np.asarray(det[0], dtype=np.float64)[:, :2].astype(np.int64).tolist()
         except Exception:
             continue
-        text = ""
-        score = None
-        if isinstance(text_part, (list, tuple)):
-            if len(text_part) >= 1:
-                text = text_part[0] if isinstance(text_part[0], str) else str(text_part[0])
-            if len(text_part) >= 2 and isinstance(text_part[1], (float,int)):
-                score = float(text_part[1])
-        elif isinstance(text_part, str):
-            text = text_part
-        else:
-            text = str(text_part)
-        out.append({"text": text, "score": score, "box": [[int(float(p[0])), int(float(p[1]))] for p in box]})
+        out.append({"text": text, "score": score, "box": norm_box})
     return out
 
-# ---- OCR with file-backed cache keyed by image mtime ----
+# ---- Image mtime, re-stat'ed at most every MTIME_TTL seconds ----
+_mtime_seen = (0.0, None, None)   # (time.monotonic() of last stat, mtime, mtime_ns); swapped as one tuple
+
+def _image_stat():
+    global _mtime_seen
+    seen = _mtime_seen
+    now = time.monotonic()
+    if seen[1] is None or now - seen[0] > MTIME_TTL:
+        st = os.stat(IMAGE_PATH)
+        seen = _mtime_seen = (now, st.st_mtime, st.st_mtime_ns)
+    return seen
+
+def image_mtime():
+    return _image_stat()[1]
+
+# full-resolution key for ?v= URLs (a replacement within the same second still changes it)
+def image_version():
+    return _image_stat()[2]
+
+# ---- OCR with in-memory + file-backed cache keyed by image mtime ----
+_mem_cache = {}   # abs path -> (mtime, parsed); the file is only read on a miss here
+
 def run_ocr_cached():
-    mtime = os.path.getmtime(IMAGE_PATH)
-    cache = load_cache()
+    mtime = image_mtime()
     key = os.path.abspath(IMAGE_PATH)
-    entry = cache.get(key)
-    if entry and entry.get("mtime") == mtime and "ocr" in entry:
-        return entry["ocr"]
+    hit = _mem_cache.get(key)
+    if hit and hit[0] == mtime:
+        return hit[1]
     with cache_lock:
-        cache = load_cache()
-        entry = cache.get(key)
+        hit = _mem_cache.get(key)
+        if hit and hit[0] == mtime:
+            return hit[1]
+        entry = load_cache(key)
         if entry and entry.get("mtime") == mtime and "ocr" in entry:
+            _mem_cache[key] = (mtime, entry["ocr"])
             return entry["ocr"]
         ocr = get_ocr()
         img = open_and_downscale(IMAGE_PATH, MAX_DIM)
-        try:
-            raw = ocr.ocr(img, cls=USE_ANGLE)
-        except TypeError:
-            raw = ocr.ocr(IMAGE_PATH, cls=USE_ANGLE)
+        arr = to_bgr_array(img)
+        raw = ocr.ocr(arr, cls=USE_ANGLE)
         parsed = parse_paddle(raw)
-        cache[key] = {"mtime": mtime, "ocr": parsed, "cached_at": time.time()}
-        save_cache(cache)
+        save_thumb(img, mtime)
+        save_cache(key, {"mtime": mtime, "ocr": parsed, "cached_at": time.time()})
+        _mem_cache[key] = (mtime, parsed)
         return parsed
 
 # ---- Routes ----
@@ -170,14 +498,28 @@ def index():
         parsed = run_ocr_cached()
         lines = [it.get("text","") for it in parsed]
         joined = "\n".join(filter(None, lines)) or "(no text found)"
-        return render_template_string(HTML_TMPL, img_name=os.path.basename(IMAGE_PATH), text=joined)
+        return page_tmpl.render(img_name=os.path.basename(IMAGE_PATH), text=joined, v=image_version())
     except Exception as e:
         return f"Error running OCR: {e}", 500
 
+# conditional + ETag/Last-Modified -> repeat hits are 304s; max_age lets browsers skip even those
 @app.route("/image")
 def image():
+    mtime = image_mtime()
+    if ensure_thumb(mtime):
+        return send_file(os.path.abspath(THUMB_FN), mimetype="image/jpeg", conditional=True, etag=True,
+                         last_modified=mtime, max_age=IMAGE_MAX_AGE)
+    # couldn't build the preview: send the original, but don't let browsers pin it to the preview URL
+    return send_original(max_age=None)
+
+@app.route("/image/full")
+def image_full():
+    return send_original(max_age=IMAGE_MAX_AGE)
+
+def send_original(max_age):
     mime, _ = mimetypes.guess_type(IMAGE_PATH)
-    return send_file(IMAGE_PATH, mimetype=mime or "application/octet-stream")
+    return send_file(IMAGE_PATH, mimetype=mime or "application/octet-stream", conditional=True, etag=True,
+                     last_modified=image_mtime(), max_age=max_age)
 
 @app.route("/api/ocr")
 def api_ocr():
@@ -193,5 +535,10 @@ def health():
 
 if __name__ == "__main__":
     print(f"Serving (CPU-only) image: {IMAGE_PATH}")
+    warmup_ocr()
     print(f"Server: http://{HOST}:{PORT}/")
-    app.run(host=HOST, port=PORT, debug=False, threaded=False)
+    # OCR itself is serialized by cache_lock; threads keep /image and /health responsive meanwhile
+    app.run(host=HOST, port=PORT, debug=False, threaded=True)
+else:
+    # imported by a WSGI server (gunicorn --preload app:app): load the model once, before fork
+    warmup_ocr()